@@ -1,6 +1,11 @@
 import os
 import sys
 import json
+import uuid
+import hmac
+import queue
+import threading
+from functools import wraps
 from flask import Flask, render_template, request, jsonify, session, Response, stream_with_context
 from dotenv import load_dotenv
 from flask_cors import CORS
@@ -28,18 +33,36 @@ CORS(app, origins=os.getenv('ALLOWED_ORIGINS', '*').split(','))
 from backend.llm.response_generation import LLMProcessor
 llm_processor = LLMProcessor()
 
+# Admission control for in-flight LLM streams
+from backend.llm.admission_control import AdmissionController, AdmissionRejected
+admission_controller = AdmissionController()
+
+# Chat history is kept server-side because the cookie session cannot change once streaming starts
+from backend.llm.chat_history import ChatHistoryStore
+chat_histories = ChatHistoryStore()
+
+# On-demand diagnostics, only reachable when ADMIN_TOKEN is set
+from backend.diagnostics.profiling import SamplingProfiler, MemoryTracker, object_type_summary, component_memory
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')
+profiler = SamplingProfiler()
+memory_tracker = MemoryTracker()
+
 # Constants
 QUESTION_LIMIT = 50
 MAX_CHAT_HISTORY = 20
+HEARTBEAT_INTERVAL = float(os.getenv('HEARTBEAT_INTERVAL_SECONDS', 0.5))
+STREAM_END = object()
 
 @app.route('/')
 def index():
     """
     Render the main page and reset the session.
     """
+    if 'session_id' in session:
+        chat_histories.clear(session['session_id'])
     session.clear()
+    session['session_id'] = uuid.uuid4().hex
     session['question_count'] = 0
-    session['chat_history'] = []
     return render_template('index.html')
 
 @app.route('/get_answer', methods=['POST'])
@@ -47,40 +70,108 @@ def get_answer():
     """
     Process user questions and stream AI-generated answers.
     """
-    # Uncomment the following lines to enforce question limit
-    # if session['question_count'] >= QUESTION_LIMIT:
-    #     return jsonify({'answer': 'You have reached the chat limit of this session. Please refresh the page to start a new session.'})
-
     data = request.get_json()
     question = data.get('question', '')
-    chat_history = session.get('chat_history', [])
+    session_id = session.setdefault('session_id', uuid.uuid4().hex)
+    chat_history = chat_histories.get(session_id)
+
+    try:
+        if session.get('question_count', 0) >= QUESTION_LIMIT:
+            admission_controller.record_rejection('question_limit')
+            raise AdmissionRejected('question_limit',
+                                    'You have reached the chat limit of this session. Please refresh the page to start a new session.')
+        admission_controller.admit(session_id)
+    except AdmissionRejected as rejection:
+        return overload_response(rejection)
+
+    # The cookie session is saved before the body streams, so count the question now
+    session['question_count'] = session.get('question_count', 0) + 1
+
+    # The LLM slot is held by the producer thread until the upstream call has returned
+    cancel_event = threading.Event()
+    completed = threading.Event()
+    events = queue.Queue()
+    threading.Thread(target=stream_llm_answer, args=(question, chat_history, cancel_event, events), daemon=True).start()
 
-    return Response(stream_with_context(generate_answer(question, chat_history)), content_type='text/event-stream')
+    def on_close():
+        # The client went away before the answer finished: stop the upstream stream
+        if not completed.is_set():
+            cancel_event.set()
+            admission_controller.record_cancelled()
 
-def generate_answer(question, chat_history):
+    response = Response(stream_with_context(generate_answer(session_id, question, chat_history, session['question_count'], events, cancel_event, completed)), content_type='text/event-stream')
+    response.call_on_close(on_close)
+    return response
+
+def overload_response(rejection):
+    """
+    Build the fast response sent when a request is shed: 429 with Retry-After
+    for overload, 403 for rejections that retrying cannot fix.
     """
-    Generator function to stream AI responses and update session data.
+    event = {'error': rejection.reason, 'message': rejection.message}
+    if rejection.retry_after is None:
+        return Response(f"data: {json.dumps(event)}\n\n", status=403, content_type='text/event-stream')
+    event['retry_after'] = rejection.retry_after
+    response = Response(f"data: {json.dumps(event)}\n\n", status=429, content_type='text/event-stream')
+    response.headers['Retry-After'] = str(rejection.retry_after)
+    return response
+
+def generate_answer(session_id, question, chat_history, question_count, events, cancel_event, completed):
+    """
+    Generator function to stream AI responses and update the chat history.
+
+    The LLM is consumed on a background thread so that heartbeats keep flowing
+    while we wait for tokens. Writing to a closed connection makes the server
+    close this generator, which cancels the upstream LLM stream.
     """
     full_answer = ""
-    for partial_answer in llm_processor.get_answer_with_sources(question, chat_history):
-        if partial_answer:
-            full_answer = partial_answer
-            yield f"data: {json.dumps({'partial_answer': partial_answer})}\n\n"
+    citations = []
+    try:
+        while True:
+            try:
+                item = events.get(timeout=HEARTBEAT_INTERVAL)
+            except queue.Empty:
+                # SSE comment line, ignored by the client but detects dead connections
+                yield ": heartbeat\n\n"
+                continue
+            if item is STREAM_END:
+                break
+            partial_answer, answer_citations = item
+            if answer_citations is not None:
+                citations = answer_citations
+            if partial_answer:
+                full_answer = partial_answer
+                yield f"data: {json.dumps({'partial_answer': partial_answer})}\n\n"
+        completed.set()
+    finally:
+        if not completed.is_set():
+            cancel_event.set()
     
-    # Update chat history and session data
-    update_session(question, full_answer, chat_history)
+    # Update chat history
+    update_session(session_id, question, full_answer, chat_history)
     
-    yield f"data: {json.dumps({'complete': True, 'chat_history': chat_history, 'question_count': session['question_count']})}\n\n"
+    yield f"data: {json.dumps({'complete': True, 'citations': citations, 'chat_history': chat_history, 'question_count': question_count})}\n\n"
 
-def update_session(question, answer, chat_history):
+def stream_llm_answer(question, chat_history, cancel_event, events):
+    """
+    Pull the answer from the LLM and hand each update to the response generator.
+    Releases the admission slot once the upstream call has actually finished.
     """
-    Update the session with new chat history and question count.
+    try:
+        for item in llm_processor.get_answer_with_sources(question, chat_history, cancel_event):
+            events.put(item)
+    finally:
+        admission_controller.release()
+        events.put(STREAM_END)
+
+def update_session(session_id, question, answer, chat_history):
     """
-    chat_history.append({"question": question, "answer": answer})
+    Store the updated chat history for the session.
+    """
+    chat_history.append({"question": question, "answer": llm_processor.strip_citations(answer)})
     if len(chat_history) > MAX_CHAT_HISTORY:
         chat_history.pop(0)
-    session['chat_history'] = chat_history
-    session['question_count'] = session.get('question_count', 0) + 1
+    chat_histories.set(session_id, chat_history)
 
 @app.route("/store_feedback", methods=["POST"])
 def store_feedback():
@@ -136,5 +227,122 @@ def view_feedback():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+def admin_required(view):
+    """
+    Restrict a route to callers presenting the ADMIN_TOKEN in the X-Admin-Token header.
+    Routes are hidden entirely when no token is configured.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not ADMIN_TOKEN:
+            return jsonify({"error": "Not found"}), 404
+        if not hmac.compare_digest(request.headers.get('X-Admin-Token', ''), ADMIN_TOKEN):
+            return jsonify({"error": "Forbidden"}), 403
+        return view(*args, **kwargs)
+    return wrapper
+
+@app.route("/admin/admission_stats", methods=["GET"])
+@admin_required
+def admission_stats():
+    """
+    Report LLM concurrency, queue depth and rejection counts.
+    """
+    return jsonify(admission_controller.stats())
+
+@app.route("/admin/diagnostics/profile/start", methods=["POST"])
+@admin_required
+def start_profile():
+    """
+    Start sampling CPU stacks of every thread in this worker.
+    """
+    try:
+        interval = float((request.get_json(silent=True) or {}).get('interval', 0.01))
+        profiler.start(interval)
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": f"Invalid interval: {e}"}), 400
+    except RuntimeError as e:
+        return jsonify({"error": str(e)}), 409
+    return jsonify({"success": True, "interval": interval})
+
+@app.route("/admin/diagnostics/profile/stop", methods=["POST"])
+@admin_required
+def stop_profile():
+    """
+    Stop sampling and return folded stacks for flamegraph tools.
+    """
+    try:
+        folded, summary = profiler.stop()
+    except RuntimeError as e:
+        return jsonify({"error": str(e)}), 409
+    response = Response(folded, content_type='text/plain')
+    response.headers['X-Profile-Samples'] = str(summary['samples'])
+    response.headers['X-Profile-Duration'] = str(summary['duration_seconds'])
+    return response
+
+@app.route("/admin/diagnostics/tracemalloc/start", methods=["POST"])
+@admin_required
+def start_tracemalloc():
+    """
+    Start tracing allocations with the requested traceback depth.
+    """
+    try:
+        frames = int((request.get_json(silent=True) or {}).get('frames', 10))
+        memory_tracker.start(frames)
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": f"Invalid frames: {e}"}), 400
+    except RuntimeError as e:
+        return jsonify({"error": str(e)}), 409
+    return jsonify({"success": True, "frames": frames})
+
+@app.route("/admin/diagnostics/tracemalloc/stop", methods=["POST"])
+@admin_required
+def stop_tracemalloc():
+    """
+    Stop tracing allocations and discard retained snapshots.
+    """
+    memory_tracker.stop()
+    return jsonify({"success": True})
+
+@app.route("/admin/diagnostics/tracemalloc/snapshot", methods=["POST"])
+@admin_required
+def tracemalloc_snapshot():
+    """
+    Take a tracemalloc snapshot and return its top allocation sites.
+    """
+    try:
+        return jsonify(memory_tracker.snapshot(request.args.get('limit', 25, type=int)))
+    except RuntimeError as e:
+        return jsonify({"error": str(e)}), 409
+
+@app.route("/admin/diagnostics/tracemalloc/diff", methods=["GET"])
+@admin_required
+def tracemalloc_diff():
+    """
+    Compare two snapshots, e.g. /admin/diagnostics/tracemalloc/diff?from=1&to=2
+    """
+    try:
+        diff = memory_tracker.diff(request.args.get('from', type=int), request.args.get('to', type=int),
+                                   request.args.get('limit', 25, type=int))
+    except KeyError as e:
+        return jsonify({"error": str(e)}), 404
+    return jsonify(diff)
+
+@app.route("/admin/diagnostics/memory", methods=["GET"])
+@admin_required
+def memory_report():
+    """
+    Report estimated memory of loaded models and caches plus live objects per type.
+    """
+    components = {
+        "embedding_model": llm_processor.embedding_model,
+        "pinecone_index": llm_processor.index,
+        "session_rate_limits": admission_controller.session_buckets(),
+        "chat_histories": chat_histories.snapshot()
+    }
+    return jsonify({
+        "components_estimated": component_memory(components),
+        "object_types": object_type_summary(request.args.get('limit', 25, type=int))
+    })
+
 if __name__ == "__main__":
     app.run(host='0.0.0.0')
@@ -0,0 +1,225 @@
+import gc
+import logging
+import sys
+import threading
+import time
+import tracemalloc
+import types
+from collections import Counter
+
+# Sampling faster than this walks every stack in a tight loop and starves the worker
+MIN_SAMPLE_INTERVAL = 0.001
+MAX_TRACEBACK_FRAMES = 100
+# Each snapshot holds every trace, so only the most recent few are kept
+MAX_SNAPSHOTS = 5
+# Process-wide objects a component may reference but does not own; the size walk stops here
+SHARED_OBJECT_TYPES = (
+    type,
+    types.ModuleType,
+    types.FunctionType,
+    types.BuiltinFunctionType,
+    types.MethodType,
+    types.CodeType,
+    types.FrameType,
+    logging.Logger,
+    logging.Manager,
+    logging.PlaceHolder,
+    logging.Handler,
+    threading.Thread,
+    threading.Event,
+    threading.Condition,
+    type(threading.Lock()),
+    type(threading.RLock())
+)
+
+class SamplingProfiler:
+    """
+    Samples the stacks of every thread in the process at a fixed interval.
+    Nothing runs until `start` is called, so there is no overhead when idle.
+    Output is in the folded format understood by flamegraph.pl and speedscope.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop_event = threading.Event()
+        self._stacks = Counter()
+        self._samples = 0
+        self._started_at = None
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def start(self, interval=0.01):
+        if not MIN_SAMPLE_INTERVAL <= interval <= 60:
+            raise ValueError(f"interval must be between {MIN_SAMPLE_INTERVAL} and 60 seconds.")
+        with self._lock:
+            if self._thread is not None:
+                raise RuntimeError("Profiler is already running.")
+            self._stacks = Counter()
+            self._samples = 0
+            self._started_at = time.monotonic()
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, args=(interval,), name="sampling-profiler", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """
+        Stop sampling and return the folded stacks plus a short summary.
+        """
+        with self._lock:
+            if self._thread is None:
+                raise RuntimeError("Profiler is not running.")
+            self._stop_event.set()
+            self._thread.join()
+            self._thread = None
+            duration = time.monotonic() - self._started_at
+        folded = "\n".join(f"{stack} {count}" for stack, count in self._stacks.most_common())
+        return folded, {'samples': self._samples, 'duration_seconds': round(duration, 3)}
+
+    def _run(self, interval):
+        own_id = threading.get_ident()
+        thread_names = {}
+        while not self._stop_event.wait(interval):
+            for thread in threading.enumerate():
+                thread_names[thread.ident] = thread.name
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({code.co_filename}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stack.append(thread_names.get(thread_id, str(thread_id)))
+                self._stacks[";".join(reversed(stack))] += 1
+            self._samples += 1
+
+class MemoryTracker:
+    """
+    Thin wrapper around tracemalloc that keeps numbered snapshots for diffing.
+    tracemalloc is only enabled between `start` and `stop`, and only the last
+    `max_snapshots` snapshots are retained.
+    """
+    def __init__(self, max_snapshots=MAX_SNAPSHOTS):
+        self.max_snapshots = max_snapshots
+        self._lock = threading.Lock()
+        self._snapshots = {}
+        self._next_id = 1
+
+    def start(self, frames=10):
+        if not 1 <= frames <= MAX_TRACEBACK_FRAMES:
+            raise ValueError(f"frames must be between 1 and {MAX_TRACEBACK_FRAMES}.")
+        if tracemalloc.is_tracing():
+            raise RuntimeError(f"tracemalloc is already running with {tracemalloc.get_traceback_limit()} frames.")
+        tracemalloc.start(frames)
+
+    def stop(self):
+        with self._lock:
+            self._snapshots.clear()
+        tracemalloc.stop()
+
+    def snapshot(self, limit=25):
+        if not tracemalloc.is_tracing():
+            raise RuntimeError("tracemalloc is not running.")
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>")
+        ])
+        with self._lock:
+            snapshot_id = self._next_id
+            self._next_id += 1
+            self._snapshots[snapshot_id] = snapshot
+            while len(self._snapshots) > self.max_snapshots:
+                del self._snapshots[next(iter(self._snapshots))]
+            retained = list(self._snapshots)
+        current, peak = tracemalloc.get_traced_memory()
+        return {
+            'snapshot_id': snapshot_id,
+            'traced_bytes': current,
+            'peak_bytes': peak,
+            'retained_snapshots': retained,
+            'top': [self._format_stat(stat) for stat in snapshot.statistics('lineno')[:limit]]
+        }
+
+    def diff(self, from_id, to_id, limit=25):
+        with self._lock:
+            if from_id not in self._snapshots or to_id not in self._snapshots:
+                raise KeyError("Unknown snapshot id.")
+            old, new = self._snapshots[from_id], self._snapshots[to_id]
+        return [
+            dict(self._format_stat(stat), size_diff=stat.size_diff, count_diff=stat.count_diff)
+            for stat in new.compare_to(old, 'lineno')[:limit]
+        ]
+
+    @staticmethod
+    def _format_stat(stat):
+        frame = stat.traceback[0]
+        return {'location': f"{frame.filename}:{frame.lineno}", 'size': stat.size, 'count': stat.count}
+
+def object_type_summary(limit=25):
+    """
+    Count live objects tracked by the garbage collector, grouped by type.
+    """
+    counts = Counter()
+    sizes = Counter()
+    for obj in gc.get_objects():
+        type_name = type(obj).__qualname__
+        counts[type_name] += 1
+        try:
+            sizes[type_name] += sys.getsizeof(obj)
+        except TypeError:
+            pass
+    return [
+        {'type': type_name, 'count': counts[type_name], 'shallow_bytes': size}
+        for type_name, size in sizes.most_common(limit)
+    ]
+
+def estimate_size(obj, max_objects=100000):
+    """
+    Estimate the memory held by an object. Torch modules (e.g. SentenceTransformer)
+    are measured by their parameter and buffer storage; anything else is walked
+    through containers and instance attributes, stopping at shared objects such as
+    modules, loggers, functions, threads and locks.
+
+    Returns:
+        tuple: (estimated bytes, method used for the estimate)
+    """
+    if callable(getattr(obj, 'parameters', None)) and callable(getattr(obj, 'buffers', None)):
+        tensors = list(obj.parameters()) + list(obj.buffers())
+        return sum(t.numel() * t.element_size() for t in tensors), 'tensor_storage'
+
+    seen = set()
+    pending = [obj]
+    total = 0
+    while pending and len(seen) < max_objects:
+        current = pending.pop()
+        if id(current) in seen or isinstance(current, SHARED_OBJECT_TYPES):
+            continue
+        seen.add(id(current))
+        try:
+            total += sys.getsizeof(current)
+        except TypeError:
+            continue
+        if isinstance(current, dict):
+            pending.extend(current.keys())
+            pending.extend(current.values())
+        elif isinstance(current, (list, tuple, set, frozenset)):
+            pending.extend(current)
+        elif hasattr(current, '__dict__'):
+            pending.append(vars(current))
+    return total, 'reference_walk'
+
+def component_memory(components):
+    """
+    Report estimated memory for each named component, e.g. loaded models and caches.
+    Figures are approximations, not exact ownership accounting.
+    """
+    report = {}
+    for name, obj in components.items():
+        try:
+            estimated_bytes, method = estimate_size(obj)
+            report[name] = {'estimated_bytes': estimated_bytes, 'method': method}
+        except Exception as e:
+            report[name] = {'error': str(e)}
+    return report
@@ -0,0 +1,194 @@
+import os
+import threading
+import time
+from dotenv import load_dotenv
+
+# Load environment variables from the .env file
+load_dotenv()
+
+# Load configuration from environment variables
+MAX_CONCURRENT_STREAMS = int(os.getenv('MAX_CONCURRENT_STREAMS', 8))
+MAX_QUEUED_REQUESTS = int(os.getenv('MAX_QUEUED_REQUESTS', 16))
+QUEUE_TIMEOUT_SECONDS = float(os.getenv('QUEUE_TIMEOUT_SECONDS', 10))
+SESSION_RATE_PER_MINUTE = float(os.getenv('SESSION_RATE_PER_MINUTE', 10))
+SESSION_BURST = int(os.getenv('SESSION_BURST', 3))
+MAX_TRACKED_SESSIONS = 10000
+
+class TokenBucket:
+    """
+    Classic token bucket: refills at `rate` tokens per second up to `capacity`.
+    """
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_consume(self, now):
+        self.refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def seconds_until_available(self):
+        if self.tokens >= 1 or self.rate <= 0:
+            return 0
+        return (1 - self.tokens) / self.rate
+
+class AdmissionRejected(Exception):
+    """
+    Raised when a request is shed instead of being admitted to the LLM.
+    A `retry_after` of None marks the rejection as final (not worth retrying).
+    """
+    def __init__(self, reason, message, retry_after=None):
+        super().__init__(message)
+        self.reason = reason
+        self.message = message
+        self.retry_after = None if retry_after is None else max(1, int(round(retry_after)))
+
+class AdmissionController:
+    """
+    Guards the LLM with a global concurrency limit, a bounded wait queue and
+    per-session token buckets. All counters are exposed through `stats()`.
+    """
+    def __init__(self, max_concurrent=MAX_CONCURRENT_STREAMS, max_queued=MAX_QUEUED_REQUESTS,
+                 queue_timeout=QUEUE_TIMEOUT_SECONDS, rate_per_minute=SESSION_RATE_PER_MINUTE,
+                 burst=SESSION_BURST):
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst
+
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._in_flight = 0
+        self._queued = 0
+        self._admitted = 0
+        self._cancelled = 0
+        self._rejected = {'rate_limited': 0, 'queue_full': 0, 'queue_timeout': 0, 'question_limit': 0}
+
+    def check_rate(self, session_id):
+        """
+        Consume one token from the session's bucket or raise AdmissionRejected.
+        """
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(session_id)
+            if bucket is None:
+                if len(self._buckets) >= MAX_TRACKED_SESSIONS:
+                    self._prune_buckets(now)
+                bucket = self._buckets[session_id] = TokenBucket(self.rate, self.burst)
+            if bucket.try_consume(now):
+                return
+            self._rejected['rate_limited'] += 1
+            retry_after = bucket.seconds_until_available()
+        raise AdmissionRejected('rate_limited',
+                                'You are sending questions too quickly. Please wait a moment and try again.',
+                                retry_after)
+
+    def refund(self, session_id):
+        """
+        Return a token taken by `check_rate` for a request that was never served.
+        """
+        with self._lock:
+            bucket = self._buckets.get(session_id)
+            if bucket is not None:
+                bucket.refill(time.monotonic())
+                bucket.tokens = min(bucket.capacity, bucket.tokens + 1)
+
+    def admit(self, session_id):
+        """
+        Apply the session rate limit, then wait for an LLM slot. A session is not
+        charged for requests shed because the server is overloaded.
+        """
+        self.check_rate(session_id)
+        try:
+            self.acquire()
+        except AdmissionRejected:
+            self.refund(session_id)
+            raise
+
+    def _prune_buckets(self, now):
+        # Buckets that have refilled completely carry no state worth keeping
+        for session_id, bucket in list(self._buckets.items()):
+            bucket.refill(now)
+            if bucket.tokens >= bucket.capacity:
+                del self._buckets[session_id]
+
+    def record_rejection(self, reason):
+        with self._lock:
+            self._rejected[reason] = self._rejected.get(reason, 0) + 1
+
+    def acquire(self):
+        """
+        Take an LLM slot, waiting in the bounded queue for up to `queue_timeout`
+        seconds. Raises AdmissionRejected when the queue is full or the wait times out.
+        """
+        if self._slots.acquire(blocking=False):
+            self._on_admitted()
+            return
+
+        with self._lock:
+            if self._queued >= self.max_queued:
+                self._rejected['queue_full'] += 1
+                raise AdmissionRejected('queue_full',
+                                        'The assistant is handling too many questions right now. Please try again shortly.',
+                                        self.queue_timeout)
+            self._queued += 1
+
+        try:
+            admitted = self._slots.acquire(timeout=self.queue_timeout)
+        finally:
+            with self._lock:
+                self._queued -= 1
+
+        if not admitted:
+            self.record_rejection('queue_timeout')
+            raise AdmissionRejected('queue_timeout',
+                                    'The assistant is busy right now. Please try again shortly.',
+                                    self.queue_timeout)
+        self._on_admitted()
+
+    def _on_admitted(self):
+        with self._lock:
+            self._in_flight += 1
+            self._admitted += 1
+
+    def release(self):
+        with self._lock:
+            self._in_flight -= 1
+        self._slots.release()
+
+    def record_cancelled(self):
+        """
+        Count a stream abandoned by its client before the answer finished.
+        """
+        with self._lock:
+            self._cancelled += 1
+
+    def session_buckets(self):
+        """
+        Return a snapshot copy of the per-session token buckets.
+        """
+        with self._lock:
+            return dict(self._buckets)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'in_flight': self._in_flight,
+                'max_concurrent': self.max_concurrent,
+                'queue_depth': self._queued,
+                'max_queued': self.max_queued,
+                'admitted': self._admitted,
+                'rejected': dict(self._rejected),
+                'cancelled_streams': self._cancelled,
+                'tracked_sessions': len(self._buckets)
+            }
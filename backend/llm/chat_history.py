@@ -0,0 +1,43 @@
+import threading
+from collections import OrderedDict
+
+MAX_STORED_SESSIONS = 10000
+
+class ChatHistoryStore:
+    """
+    In-memory chat history per session id. The least recently used sessions
+    are evicted once `max_sessions` is reached.
+    """
+    def __init__(self, max_sessions=MAX_STORED_SESSIONS):
+        self.max_sessions = max_sessions
+        self._lock = threading.Lock()
+        self._histories = OrderedDict()
+
+    def get(self, session_id):
+        """
+        Return a copy of the session's chat history (empty if unknown).
+        """
+        with self._lock:
+            history = self._histories.get(session_id)
+            if history is None:
+                return []
+            self._histories.move_to_end(session_id)
+            return list(history)
+
+    def set(self, session_id, chat_history):
+        with self._lock:
+            self._histories[session_id] = list(chat_history)
+            self._histories.move_to_end(session_id)
+            while len(self._histories) > self.max_sessions:
+                self._histories.popitem(last=False)
+
+    def snapshot(self):
+        """
+        Return a copy of all stored histories, e.g. for memory diagnostics.
+        """
+        with self._lock:
+            return {session_id: list(history) for session_id, history in self._histories.items()}
+
+    def clear(self, session_id):
+        with self._lock:
+            self._histories.pop(session_id, None)
@@ -1,4 +1,5 @@
 import os
+import re
 from dotenv import load_dotenv
 from langchain_pinecone import PineconeVectorStore
 from langchain_google_genai import ChatGoogleGenerativeAI
@@ -7,10 +8,16 @@ from pinecone import Pinecone
 from sentence_transformers import SentenceTransformer
 from langchain_core.messages import HumanMessage, AIMessage
 from typing import List, Dict
+from concurrent.futures import ThreadPoolExecutor
+from backend.pinecone.query_router import SourceRouter
+from backend.llm.admission_control import MAX_CONCURRENT_STREAMS
 
 # Load environment variables from the .env file
 load_dotenv()
 
+# Inline context-ID markers such as [2] or [1, 3]
+CITATION_MARKER = re.compile(r'\[(\d+(?:\s*,\s*\d+)*)\]')
+
 # Set Google API Key for Gemini
 os.environ["GOOGLE_API_KEY"] = os.getenv('GOOGLE_API_KEY')
 os.environ['PINECONE_API_KEY'] = os.getenv('PINECONE_API_KEY')
@@ -23,6 +30,7 @@ class LLMProcessor:
         embedding_model = os.getenv('EMBEDDING_MODEL')
         index_name = os.getenv('INDEX_NAME')
         namespace = os.getenv('NAMESPACE')
+        centroids_path = os.getenv('SOURCE_CENTROIDS_PATH', 'data/datasets/source_centroids.json')
 
         # Initialize LLM
         self.llm = ChatGoogleGenerativeAI(model=llm_model, temperature=0.3, streaming=True)
@@ -42,6 +50,21 @@ class LLMProcessor:
         self.vectorstore = PineconeVectorStore(index=self.index, embedding=self.embeddings, namespace=self.namespace)
         self.retriever = self.vectorstore.as_retriever(search_kwargs={"k": 5})
 
+        # Route queries to per-source partitions when the index has been partitioned
+        self.router = SourceRouter.from_file(
+            centroids_path,
+            max_partitions=int(os.getenv('ROUTER_MAX_PARTITIONS', 3)),
+            margin=float(os.getenv('ROUTER_MARGIN', 0.05))
+        )
+        self.fallback_namespaces = None if self.router else self.find_source_namespaces()
+        if self.router is None:
+            print(f"WARNING: source centroids not found at {centroids_path}; "
+                  f"searching {len(self.fallback_namespaces) or 'the configured'} namespace(s) without routing.")
+
+        # Shared by all requests, so size it for every admitted stream fanning out at once
+        fan_out = self.router.max_partitions if self.router else max(len(self.fallback_namespaces), 1)
+        self.executor = ThreadPoolExecutor(max_workers=fan_out * MAX_CONCURRENT_STREAMS)
+
     def embed_text(self, text):
         try:
             return self.embedding_model.encode(text)
@@ -49,7 +72,72 @@ class LLMProcessor:
             print(f"Error embedding text: {str(e)}")
             return None
 
-    def get_answer_with_sources(self, question: str, chat_history: List[Dict] = []):
+    def find_source_namespaces(self):
+        """
+        List the per-source namespaces present in the index, so a partitioned
+        index can still be searched when the centroids file is missing.
+        """
+        try:
+            namespaces = self.index.describe_index_stats()['namespaces']
+        except Exception as e:
+            print(f"Error listing index namespaces: {e}")
+            return []
+        return sorted(ns for ns in namespaces if ns.startswith('source-'))
+
+    def search(self, query_embedding, top_k=10):
+        """
+        Query the partitions picked by the router in parallel and merge the
+        matches by score. Without centroids every source partition is searched,
+        and an unpartitioned index falls back to the configured namespace.
+        Partitions that fail are skipped as long as at least one succeeds.
+        """
+        if self.router is not None:
+            namespaces = self.router.route(query_embedding)
+        elif self.fallback_namespaces:
+            namespaces = self.fallback_namespaces
+        else:
+            return self.index.query(
+                vector=query_embedding,
+                top_k=top_k,
+                namespace=self.namespace,
+                include_metadata=True
+            )['matches']
+
+        futures = {
+            namespace: self.executor.submit(
+                self.index.query,
+                vector=query_embedding,
+                top_k=top_k,
+                namespace=namespace,
+                include_metadata=True
+            )
+            for namespace in namespaces
+        }
+        matches = []
+        errors = []
+        for namespace, future in futures.items():
+            try:
+                matches.extend(future.result()['matches'])
+            except Exception as e:
+                print(f"Error querying namespace {namespace}: {e}")
+                errors.append(e)
+        if errors and len(errors) == len(futures):
+            raise errors[0]
+        matches.sort(key=lambda match: match['score'], reverse=True)
+        return matches[:top_k]
+
+    def get_answer_with_sources(self, question: str, chat_history: List[Dict] = [], cancel_event=None):
+        """
+        Stream the answer as (partial_answer, citations) pairs.
+
+        `cancel_event` (a threading.Event) is checked before the Pinecone search,
+        before the LLM call and after every chunk; once it is set, the upstream
+        stream is closed and nothing more is yielded. A call that is blocked
+        waiting for its first or next chunk cannot be interrupted from another
+        thread (LangChain does not expose the underlying request), so cancellation
+        takes effect when that chunk arrives. The caller keeps its admission slot
+        until then.
+        """
         try:
             # Convert chat history to LangChain message format
             messages = []
@@ -64,14 +152,12 @@ class LLMProcessor:
 
             # Embed the query
             query_embedding = self.embeddings.embed_query(question)
+
+            if cancel_event is not None and cancel_event.is_set():
+                return
             
-            # Search Pinecone
-            results = self.index.query(
-                vector=query_embedding, 
-                top_k=10, 
-                namespace=self.namespace, 
-                include_metadata=True
-            )
+            # Search Pinecone across the routed partitions
+            matches = self.search(query_embedding, top_k=10)
             
             # Process relevant documents as before
             import json
@@ -82,16 +168,17 @@ class LLMProcessor:
                     'page_numbers': (
                     lambda pages: pages.split('-')[0] if len(pages.split('-')) == 2 
                     and pages.split('-')[0] == pages.split('-')[1] else pages
-                    )(json.loads(doc['metadata'].get('metadata')).get('page_numbers'))
+                    )(json.loads(doc['metadata'].get('metadata')).get('page_numbers')),
+                    'alternate_citations': json.loads(doc['metadata'].get('metadata')).get('alternate_citations', [])
                 }
-                for doc in results['matches']
+                for doc in matches
             ]
 
             # Build context without chat history
             context = "\nExtracted documents:\n"
             context += "".join([
-                f'\n<a href="#" class="context-link" data-context-id="{i+1}">Context ID: {i+1}</a>'
-                f'\nSource: {doc["source"]}\nPage(s): {doc["page_numbers"]}\n{doc["text"]}'
+                f'\nContext ID: [{i+1}]'
+                f'\nSource: {doc["source"]}\n{doc["text"]}'
                 for i, doc in enumerate(relevant_docs_new)
             ])
 
@@ -105,19 +192,81 @@ class LLMProcessor:
                 # Add the final prompt as a human message
                 messages.append(HumanMessage(content=final_prompt))
                 
+                if cancel_event is not None and cancel_event.is_set():
+                    return
+
                 # Stream the response using the message history
                 response_stream = self.llm.stream(messages)
                 
                 partial_response = ""
-                for chunk in response_stream:
-                    if chunk.content:
-                        partial_response += chunk.content
-                        yield partial_response
+                try:
+                    for chunk in response_stream:
+                        if cancel_event is not None and cancel_event.is_set():
+                            return
+                        if chunk.content:
+                            partial_response += chunk.content
+                            yield partial_response, None
+                finally:
+                    # Stop pulling tokens once we are done or the next chunk shows we were cancelled
+                    response_stream.close()
+
+                # Sources are rendered by the frontend from structured data
+                yield None, self.extract_citations(partial_response, relevant_docs_new)
             else:
-                yield "No relevant context found to answer the question."
+                yield "No relevant context found to answer the question.", []
         except Exception as e:
             print(f"Error: {e}")
-            yield None
+            yield None, []
+
+    def extract_citations(self, answer: str, relevant_docs: List[Dict]) -> List[Dict]:
+        """
+        Build citation data for every context ID the answer references with an
+        inline marker such as [2] or [1, 3], in order of first reference.
+        """
+        citations = {}
+        for marker in CITATION_MARKER.finditer(answer):
+            # The claim is the sentence the marker closes
+            claim_start = max(answer.rfind(sep, 0, marker.start()) for sep in ('.', '!', '?', '\n')) + 1
+            claim = answer[claim_start:marker.start()]
+            for context_id in (int(n) for n in marker.group(1).split(',')):
+                if not 1 <= context_id <= len(relevant_docs):
+                    continue
+                if context_id not in citations:
+                    doc = relevant_docs[context_id - 1]
+                    snippet_start, snippet_end = self.locate_snippet(doc['text'] or '', claim)
+                    citations[context_id] = {
+                        'context_id': context_id,
+                        'source': doc['source'],
+                        'pages': doc['page_numbers'],
+                        'snippet': (doc['text'] or '')[snippet_start:snippet_end].strip(),
+                        'snippet_start': snippet_start,
+                        'snippet_end': snippet_end,
+                        'answer_offsets': [],
+                        'alternate_citations': doc['alternate_citations']
+                    }
+                citations[context_id]['answer_offsets'].append(marker.start())
+        return list(citations.values())
+
+    def strip_citations(self, answer: str) -> str:
+        """
+        Remove inline context-ID markers. Context IDs only mean something for the
+        prompt they were generated from, so they must not leak into chat history.
+        """
+        return re.sub(r'[ \t]*' + CITATION_MARKER.pattern, '', answer)
+
+    def locate_snippet(self, text: str, claim: str, max_length: int = 300):
+        """
+        Return (start, end) offsets of the sentence in `text` that shares the most
+        words with `claim`, falling back to the start of the text.
+        """
+        claim_words = {w for w in re.findall(r'\w+', claim.lower()) if len(w) > 3}
+        best_span, best_overlap = (0, min(len(text), max_length)), 0
+        for sentence in re.finditer(r'[^.!?\n]+[.!?]?', text):
+            overlap = len(claim_words & set(re.findall(r'\w+', sentence.group().lower())))
+            if overlap > best_overlap:
+                best_overlap = overlap
+                best_span = (sentence.start(), min(sentence.end(), sentence.start() + max_length))
+        return best_span
     
     def get_prompt_template(self):
         template = """
@@ -132,17 +281,12 @@ class LLMProcessor:
         4. Provide clear, concise answers
         5. Use markdown formatting when needed (e.g., for tables, lists)
         6. Include relevant examples from the context when applicable
-        7. If a source has multiple page numbers, list them on the same line
-        
-        Sources should be listed at the end in this format:
-        Sources:  
-        - Source Name 1: Page Numbers (comma-separated)  
-        - Source Name 2: Page Numbers (comma-separated)  
+        7. Cite the context you used with its Context ID in square brackets right after the
+           statement it supports, e.g. [2] or [1, 3]
+        8. Do not list sources, source names or page numbers; they are added automatically
         
         Question: {question}
         Answer:
-
-        Sources: 
         """
         return ChatPromptTemplate.from_template(template)
 
@@ -0,0 +1,45 @@
+import os
+import json
+import numpy as np
+
+class SourceRouter:
+    """
+    Picks the source partitions (Pinecone namespaces) most likely to answer a
+    question by comparing the question embedding with per-source centroids.
+    """
+    def __init__(self, partitions, max_partitions=3, margin=0.05):
+        self.namespaces = list(partitions.keys())
+        self.sources = [partitions[ns]['source'] for ns in self.namespaces]
+        self.centroids = np.asarray([partitions[ns]['centroid'] for ns in self.namespaces], dtype=np.float32)
+        self.max_partitions = max_partitions
+        self.margin = margin
+
+    @classmethod
+    def from_file(cls, path, **kwargs):
+        """
+        Load centroids written by the indexing pipeline. Returns None when the
+        file is missing so callers can fall back to the single namespace.
+        """
+        if not path or not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r') as f:
+                partitions = json.load(f).get('partitions', {})
+        except Exception as e:
+            print(f"Error loading source centroids from {path}: {e}")
+            return None
+        return cls(partitions, **kwargs) if partitions else None
+
+    def route(self, query_embedding):
+        """
+        Return the namespaces whose centroid similarity is within `margin` of the
+        best match, capped at `max_partitions` and ordered by similarity.
+        """
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return self.namespaces[:self.max_partitions]
+        scores = self.centroids @ (query / norm)
+        ranked = np.argsort(-scores)[:self.max_partitions]
+        best = scores[ranked[0]]
+        return [self.namespaces[i] for i in ranked if scores[i] >= best - self.margin]
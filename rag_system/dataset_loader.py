@@ -1,9 +1,11 @@
 import os
 import glob
 import re
+import json
 import pandas as pd
 from tqdm import tqdm
 from langchain.docstore.document import Document as LangchainDocument
+from deduplication import MinHashDeduplicator
 
 
 # Add this mapping dictionary at the top of your file or in a configuration file
@@ -43,10 +45,15 @@ def load_or_generate_dataset_from_textfiles(txt_directory: str, dataset_dir: str
     return convert_to_langchain_documents(context_dataset)
 
 # This function creates a new dataset by reading text files
-def generate_dataset_from_textfiles(txt_directory: str, dataset_csv_path: str) -> pd.DataFrame:
-    # Find all the text files in our folder
-    txt_files = glob.glob(os.path.join(txt_directory, '*.txt'))
+def generate_dataset_from_textfiles(txt_directory: str, dataset_csv_path: str, deduplicate: bool = True) -> pd.DataFrame:
+    # Find all the text files in our folder (sorted so the same page is always kept as representative)
+    txt_files = sorted(glob.glob(os.path.join(txt_directory, '*.txt')))
     data = []
+    # Near-duplicate pages (boilerplate, tables of contents, repeated sections) are
+    # indexed once per source; their other locations are kept as alternate citations.
+    # Pages are only compared within a source so every source partition keeps its content.
+    deduplicators = {}
+    dropped_pages = 0
     # This pattern helps us get information from the file names
     pattern = r"(?P<filename>.+?)__.*__(?P<start_page>\d+)_{1,2}(?P<end_page>\d+)(?:__)?\.txt"
 
@@ -63,19 +70,41 @@ def generate_dataset_from_textfiles(txt_directory: str, dataset_csv_path: str) -
             with open(txt_file, 'r', encoding='utf-8') as file:
                 content = file.read()
 
+            page_numbers = f"{filename_metadata.get('start_page', '')}-{filename_metadata.get('end_page', '')}"
+
+            # Skip pages that nearly duplicate one we already kept
+            if deduplicate:
+                deduplicator = deduplicators.setdefault(filename_metadata.get("filename"), MinHashDeduplicator())
+                representative = deduplicator.add(len(data), content)
+                if representative is not None:
+                    data[representative]["alternate_citations"].append({
+                        "source": filename_metadata.get("filename"),
+                        "page_numbers": page_numbers
+                    })
+                    dropped_pages += 1
+                    continue
+
             # Save information about this file in our list
             data.append({
                 "text": content,
                 "filename": txt_file,
                 "start_page": filename_metadata.get("start_page"),
                 "end_page": filename_metadata.get("end_page"),
-                "page_numbers": f"{filename_metadata.get('start_page', '')}-{filename_metadata.get('end_page', '')}",
-                "source": filename_metadata.get("filename")
+                "page_numbers": page_numbers,
+                "source": filename_metadata.get("filename"),
+                "alternate_citations": []
             })
                 
         except Exception as e:
             print(f"Oops! We had trouble with this file: {txt_file}. Here's what went wrong: {e}")
 
+    if deduplicate:
+        print(f"Dropped {dropped_pages} near-duplicate pages out of {len(txt_files)} ({len(data)} kept).")
+
+    # Store alternate citations as JSON so they survive the CSV round trip
+    for row in data:
+        row["alternate_citations"] = json.dumps(row["alternate_citations"])
+
     # Turn our list of data into a table (DataFrame)
     dataset_df = pd.DataFrame(data)
     # Save our table as a CSV file so we can use it later
@@ -92,8 +121,21 @@ def convert_to_langchain_documents(dataset_df: pd.DataFrame) -> list:
                 "start_page": doc.get("start_page"),
                 "end_page": doc.get("end_page"),
                 "filename": doc.get("filename", "unknown"),
-                "page_numbers": doc.get("page_numbers")
+                "page_numbers": doc.get("page_numbers"),
+                "alternate_citations": parse_alternate_citations(doc.get("alternate_citations"))
             }
         )
         for doc in dataset_df.to_dict(orient='records')
     ]
+
+# This function reads the alternate citations column back from the CSV
+def parse_alternate_citations(value) -> list:
+    if not isinstance(value, str) or not value:
+        return []
+    return [
+        {
+            "source": SOURCE_MAPPING.get(citation.get("source"), citation.get("source")),
+            "page_numbers": citation.get("page_numbers")
+        }
+        for citation in json.loads(value)
+    ]
@@ -0,0 +1,89 @@
+# deduplication.py
+import random
+import re
+import zlib
+
+# Mersenne prime used for the universal hash family
+_PRIME = (1 << 61) - 1
+
+class MinHashDeduplicator:
+    """
+    Streaming near-duplicate detector using MinHash signatures over word shingles
+    and locality-sensitive hashing (banding) to find candidates.
+
+    Pages are added one at a time; each page is either kept as a new
+    representative or matched to an earlier representative it nearly duplicates.
+
+    Args:
+        num_perm (int): Number of hash permutations in each signature.
+        bands (int): Number of LSH bands. Must divide num_perm.
+        shingle_size (int): Number of words per shingle.
+        threshold (float): Minimum estimated Jaccard similarity to call two pages duplicates.
+        seed (int): Seed for the hash permutations, so runs are reproducible.
+    """
+    def __init__(self, num_perm=128, bands=32, shingle_size=5, threshold=0.85, seed=42):
+        if num_perm % bands != 0:
+            raise ValueError("num_perm must be divisible by bands.")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.threshold = threshold
+        rng = random.Random(seed)
+        self.permutations = [(rng.randrange(1, _PRIME), rng.randrange(0, _PRIME)) for _ in range(num_perm)]
+        self.buckets = [{} for _ in range(bands)]
+        self.signatures = {}
+
+    def shingles(self, text):
+        """
+        Split normalised text into overlapping word shingles, hashed to 32 bits.
+        """
+        words = re.findall(r'\w+', text.lower())
+        if len(words) < self.shingle_size:
+            return {zlib.crc32(" ".join(words).encode('utf-8'))}
+        return {
+            zlib.crc32(" ".join(words[i:i + self.shingle_size]).encode('utf-8'))
+            for i in range(len(words) - self.shingle_size + 1)
+        }
+
+    def signature(self, text):
+        shingles = self.shingles(text)
+        return tuple(
+            min((a * s + b) % _PRIME for s in shingles)
+            for a, b in self.permutations
+        )
+
+    def similarity(self, sig_a, sig_b):
+        """
+        Estimate Jaccard similarity as the fraction of matching signature slots.
+        """
+        return sum(x == y for x, y in zip(sig_a, sig_b)) / self.num_perm
+
+    def add(self, key, text):
+        """
+        Add a page to the index.
+
+        Args:
+            key: Identifier of the page (e.g. its position in the dataset).
+            text (str): Page content.
+
+        Returns:
+            The key of the representative this page duplicates, or None if the
+            page is new and has become a representative itself.
+        """
+        sig = self.signature(text)
+        band_keys = [sig[b * self.rows:(b + 1) * self.rows] for b in range(self.bands)]
+
+        best_key, best_score = None, self.threshold
+        candidates = {c for b, band_key in enumerate(band_keys) for c in self.buckets[b].get(band_key, ())}
+        for candidate in candidates:
+            score = self.similarity(sig, self.signatures[candidate])
+            if score >= best_score:
+                best_key, best_score = candidate, score
+        if best_key is not None:
+            return best_key
+
+        self.signatures[key] = sig
+        for b, band_key in enumerate(band_keys):
+            self.buckets[b].setdefault(band_key, []).append(key)
+        return None
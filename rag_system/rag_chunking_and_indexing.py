@@ -1,4 +1,5 @@
 import os
+import sys
 from dataset_loader import load_or_generate_dataset_from_textfiles
 import llm_provider as LLMProvider
 import pinecone
@@ -7,6 +8,7 @@ import time
 import utils as RagUtility
 from dotenv import load_dotenv
 import json 
+import numpy as np
 
 # Folder containing our source text files
 TXT_PATH = 'data/raw_text'
@@ -17,7 +19,10 @@ DATASET_CSV_TEXT_PATH = "data/datasets/CXDataset.csv"
 # Load environment variables from .env file
 load_dotenv()
 
-def load_embeddings(knowledge_base, embedding_model_name, index_name):
+# Per-source centroids used by the query router
+SOURCE_CENTROIDS_PATH = os.getenv('SOURCE_CENTROIDS_PATH', "data/datasets/source_centroids.json")
+
+def load_embeddings(knowledge_base, embedding_model_name, index_name, reindex=False):
     """
     Loads embeddings for the documents and stores them in a Pinecone index.
 
@@ -27,6 +32,8 @@ def load_embeddings(knowledge_base, embedding_model_name, index_name):
         embedding_model_name: The name of the embedding model to use.
         index_name: The name of the Pinecone index.
         chunking_method: The method of chunking ('recursive' or 'per_page').
+        reindex: Re-upsert into an existing index, replacing its source partitions
+            and rewriting the source centroids.
 
     Returns:
         The Pinecone index.
@@ -43,7 +50,10 @@ def load_embeddings(knowledge_base, embedding_model_name, index_name):
     embedding_dim = embedding_model.get_sentence_embedding_dimension()
         
     if index_name in pc.list_indexes().names():
-        return pc.Index(index_name)
+        if not reindex:
+            print(f"Index {index_name} already exists; run with --reindex to re-partition it and rebuild centroids.")
+            return pc.Index(index_name)
+        clear_source_partitions(pc.Index(index_name))
     else:
         pc.create_index(index_name, dimension=embedding_dim, metric='dotproduct', spec=spec)
         while not pc.describe_index(index_name).status['ready']:
@@ -51,20 +61,66 @@ def load_embeddings(knowledge_base, embedding_model_name, index_name):
 
     index = pc.Index(index_name)
 
-    # Prepare and upsert embeddings into Pinecone
+    # Prepare and upsert embeddings into Pinecone, one namespace per source
     docs_processed = RagUtility.create_no_chunks(knowledge_base)
+    centroid_sums = {}
     
     for i, doc in enumerate(docs_processed):
         embedding = embedding_model.encode(doc.page_content)
+        namespace = RagUtility.source_namespace(doc.metadata.get('source'))
         try:
-            index.upsert([(f"doc-{i}", embedding, {"text": doc.page_content, "metadata":json.dumps(doc.metadata)})])
+            index.upsert([(f"doc-{i}", embedding, {"text": doc.page_content, "metadata":json.dumps(doc.metadata)})], namespace=namespace)
         except Exception as e:
             print(f"An error occurred: {e}")
             continue
+        accumulate_centroid(centroid_sums, namespace, doc.metadata.get('source'), embedding)
+
+    save_source_centroids(centroid_sums, SOURCE_CENTROIDS_PATH)
 
     return index
 
-def chunk_and_index():
+def clear_source_partitions(index):
+    """
+    Delete every per-source namespace so a reindex does not leave stale vectors behind.
+    """
+    namespaces = index.describe_index_stats()['namespaces']
+    for namespace in namespaces:
+        if namespace.startswith('source-'):
+            index.delete(delete_all=True, namespace=namespace)
+    print("Cleared existing source partitions before reindexing.")
+
+def accumulate_centroid(centroid_sums, namespace, source, embedding):
+    """
+    Add a document embedding to the running sum for its source partition.
+    Embeddings are normalised first so long pages do not dominate the centroid.
+    """
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    if norm == 0:
+        return
+    entry = centroid_sums.setdefault(namespace, {"source": source, "sum": np.zeros_like(vector), "count": 0})
+    entry["sum"] += vector / norm
+    entry["count"] += 1
+
+def save_source_centroids(centroid_sums, path):
+    """
+    Write the normalised centroid of every source partition to a JSON file
+    that the query router loads at startup.
+    """
+    partitions = {}
+    for namespace, entry in centroid_sums.items():
+        centroid = entry["sum"] / max(np.linalg.norm(entry["sum"]), 1e-12)
+        partitions[namespace] = {
+            "source": entry["source"],
+            "count": entry["count"],
+            "centroid": centroid.tolist()
+        }
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump({"partitions": partitions}, f)
+    print(f"Saved centroids for {len(partitions)} source partitions to {path}")
+
+def chunk_and_index(reindex=False):
     """
     This function chunks our text data and indexes it in Pinecone.
     """
@@ -79,9 +135,9 @@ def chunk_and_index():
     settings_name = f"embeddings:{embedding_model.replace('/', '~')}"
 
     # Chunk the text, create embeddings, and load them into Pinecone
-    knowledge_index = load_embeddings(contextDataset, embedding_model, "knowledge-index")
+    knowledge_index = load_embeddings(contextDataset, embedding_model, "knowledge-index", reindex)
 
     print(f"Finished chunking text and indexing in Pinecone with settings: {settings_name}")
 
 if __name__ == "__main__":
-    chunk_and_index()
+    chunk_and_index(reindex="--reindex" in sys.argv)
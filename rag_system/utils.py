@@ -1,6 +1,7 @@
 # utils.py
 from langchain.docstore.document import Document as LangchainDocument
 import pickle
+import re
 
 def create_no_chunks(documents):
     """
@@ -25,11 +26,25 @@ def create_no_chunks(documents):
             page_content=doc.page_content.strip(),
             metadata={
                 'source': doc.metadata.get('source'),
-                'page_numbers': doc.metadata.get('page_numbers')
+                'page_numbers': doc.metadata.get('page_numbers'),
+                'alternate_citations': doc.metadata.get('alternate_citations', [])
             }
         ) for doc in documents
     ]
 
+def source_namespace(source):
+    """
+    Build the Pinecone namespace name used for all vectors of a single source.
+
+    Args:
+        source (str): The display name of the source (e.g. "Finance").
+
+    Returns:
+        str: A lowercase, dash-separated namespace such as "source-finance".
+    """
+    slug = re.sub(r'[^a-z0-9]+', '-', str(source).lower()).strip('-')
+    return f"source-{slug or 'unknown'}"
+
 def save_to_file(obj, filename):
     """
     Save an object to a file using pickle.
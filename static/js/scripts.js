@@ -62,10 +62,19 @@ document.addEventListener("DOMContentLoaded", function () {
     return messageContainer;
   }
 
+  // Aborting the previous request lets the server cancel its LLM stream
+  let activeRequest = null;
+
   function sendMessage() {
     const message = userInput.value;
     if (message.trim() === "") return;
 
+    if (activeRequest) {
+      activeRequest.abort();
+    }
+    const controller = new AbortController();
+    activeRequest = controller;
+
     displayMessage(message, true);
 
     const responseContainer = displayMessage("Thinking...", false);
@@ -76,9 +85,11 @@ document.addEventListener("DOMContentLoaded", function () {
         "Content-Type": "application/json",
       },
       body: JSON.stringify({ question: message }),
+      signal: controller.signal,
     })
       .then((response) => {
-        if (!response.ok) {
+        // Shed requests (403/429) still carry an SSE error event in the body
+        if (!response.ok && response.status !== 403 && response.status !== 429) {
           throw new Error("Network response was not ok");
         }
         return response.body.getReader();
@@ -86,12 +97,18 @@ document.addEventListener("DOMContentLoaded", function () {
       .then((reader) => {
         const decoder = new TextDecoder();
         let fullResponse = "";
+        let receivedError = false;
 
         function readStream() {
           reader.read().then(({ done, value }) => {
             if (done) {
+              if (activeRequest === controller) {
+                activeRequest = null;
+              }
               scrollToBottom();
-              addFeedbackButtons(responseContainer, fullResponse);
+              if (!receivedError) {
+                addFeedbackButtons(responseContainer, fullResponse);
+              }
               return;
             }
             let chunk = decoder.decode(value, { stream: true });
@@ -99,6 +116,12 @@ document.addEventListener("DOMContentLoaded", function () {
             lines.forEach((line) => {
               if (line.startsWith("data: ")) {
                 let data = JSON.parse(line.slice(6));
+                if (data.error) {
+                  receivedError = true;
+                  responseContainer.querySelector(".message").innerHTML =
+                    marked.parse(data.message);
+                  scrollToBottom();
+                }
                 if (data.partial_answer) {
                   fullResponse = data.partial_answer;
                   responseContainer.querySelector(".message").innerHTML =
@@ -106,6 +129,9 @@ document.addEventListener("DOMContentLoaded", function () {
                   scrollToBottom();
                 }
                 if (data.complete) {
+                  if (data.citations && data.citations.length > 0) {
+                    renderCitations(responseContainer, fullResponse, data.citations);
+                  }
                   if (data.question_count >= 50) {
                     displayMessage(
                       "You have reached the chat limit of this session. Please refresh the page to start a new session.",
@@ -116,12 +142,20 @@ document.addEventListener("DOMContentLoaded", function () {
               }
             });
             readStream();
+          }).catch((error) => {
+            // The stream is aborted when a newer question replaces it
+            if (error.name !== "AbortError") {
+              console.error("Error reading stream:", error);
+            }
           });
         }
 
         readStream();
       })
       .catch((error) => {
+        if (error.name === "AbortError") {
+          return;
+        }
         console.error("Error:", error);
         responseContainer.querySelector(".message").innerHTML =
           "An error occurred. Please try again later.";
@@ -132,6 +166,61 @@ document.addEventListener("DOMContentLoaded", function () {
     autoResize(userInput);
   }
 
+  function renderCitations(container, answer, citations) {
+    const byId = {};
+    citations.forEach((citation) => {
+      byId[citation.context_id] = citation;
+    });
+
+    // Turn inline [n] markers into superscript references
+    const messageDiv = container.querySelector(".message");
+    messageDiv.innerHTML = marked
+      .parse(answer)
+      .replace(/\[(\d+(?:\s*,\s*\d+)*)\]/g, (marker, ids) => {
+        const refs = ids
+          .split(",")
+          .map((id) => byId[id.trim()])
+          .filter(Boolean)
+          .map(
+            (citation) =>
+              `<span class="citation-ref" title="${escapeHtml(
+                citation.snippet
+              )}">${citation.context_id}</span>`
+          );
+        return refs.length ? `<sup>[${refs.join(", ")}]</sup>` : marker;
+      });
+
+    const list = document.createElement("ol");
+    list.className = "citation-list";
+    citations.forEach((citation) => {
+      const item = document.createElement("li");
+      item.value = citation.context_id;
+      item.title = citation.snippet;
+      let text = `${citation.source}: Page(s) ${citation.pages}`;
+      if (citation.alternate_citations && citation.alternate_citations.length > 0) {
+        const alternates = citation.alternate_citations
+          .map((alt) => `${alt.source}: ${alt.page_numbers}`)
+          .join("; ");
+        text += ` (also in ${alternates})`;
+      }
+      item.textContent = text;
+      list.appendChild(item);
+    });
+
+    const heading = document.createElement("p");
+    heading.className = "citation-heading";
+    heading.textContent = "Sources:";
+    messageDiv.appendChild(heading);
+    messageDiv.appendChild(list);
+    scrollToBottom();
+  }
+
+  function escapeHtml(text) {
+    const div = document.createElement("div");
+    div.textContent = text || "";
+    return div.innerHTML.replace(/"/g, "&quot;");
+  }
+
   function addFeedbackButtons(container) {
     const feedbackContainer = document.createElement("div");
     feedbackContainer.className = "feedback-container";